@@ -1,18 +1,25 @@
 import discord
 from discord import ButtonStyle, TextStyle
 from discord.ui import Button, View, Modal, TextInput
-import requests
 import asyncio
 import os
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from discord.ext import tasks
 from dotenv import load_dotenv
 import sys
-import pytz
-from typing import Optional
+from typing import Optional, AsyncIterator, Iterable, Iterator
+from dataclasses import dataclass, astuple, asdict, fields
 import aiohttp
 import json
+import collections
+import time
+import hashlib
+import uuid
+import io
+import threading
+import traceback
+import contextlib
 
 # Near the top of the file, add color codes
 class Colors:
@@ -89,10 +96,428 @@ load_dotenv()
 # Constants
 BATTLEMETRICS_API_KEY = os.getenv('BATTLEMETRICS_API_KEY')
 DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
-DISCORD_CHANNEL_ID = int(os.getenv('DISCORD_CHANNEL_ID'))
+DISCORD_CHANNEL_ID = int(os.getenv('DISCORD_CHANNEL_ID') or 0)
 BATTLEMETRICS_ORG_ID = os.getenv('BATTLEMETRICS_ORG_ID')
 BATTLEMETRICS_BANLIST_ID = os.getenv('BATTLEMETRICS_BANLIST_ID')
 ADMIN_MAPPINGS = json.loads(os.getenv('ADMIN_MAPPINGS', '{}'))
+# Run BattleMetrics polling in a separate ingestion process
+MULTIPROCESS = os.getenv('MULTIPROCESS', 'false').lower() in ('1', 'true', 'yes')
+# How many posted ban ids the gateway remembers for dedup
+POSTED_BAN_HISTORY = 100
+# Posting attempts per ban before the gateway gives up on it
+MAX_BAN_POST_ATTEMPTS = 8
+# Hash of the last synced command tree, lets restarts skip tree.sync()
+COMMAND_HASH_FILE = '.command_tree_hash'
+# Event loop lag above this is logged with the blocking stack
+WATCHDOG_THRESHOLD_MS = int(os.getenv('WATCHDOG_THRESHOLD_MS', '250'))
+# Enable asyncio debug mode so slow callbacks are logged by asyncio itself
+ASYNCIO_DEBUG = os.getenv('ASYNCIO_DEBUG', 'false').lower() in ('1', 'true', 'yes')
+# Where ban exports are written
+EXPORT_DIR = os.getenv('EXPORT_DIR', 'exports')
+# Tries per export page before a rate limit, server error or timeout aborts the export
+EXPORT_MAX_ATTEMPTS = 5
+# Optional Steam Web API enrichment for ban embeds
+STEAM_API_KEY = os.getenv('STEAM_API_KEY')
+STEAM_API_URL = os.getenv('STEAM_API_URL', 'https://api.steampowered.com')
+STEAM_CACHE_TTL = int(os.getenv('STEAM_CACHE_TTL', '3600'))
+
+class StartupTimer:
+    """Collects phase-by-phase startup timings and logs them once the first ban poll completes."""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+        self.reported = False
+
+    async def track(self, phase: str, coro):
+        # Time a startup coroutine so it can run concurrently with other phases
+        phase_start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self._record(phase, 'took', time.perf_counter() - phase_start)
+
+    def mark(self, phase: str):
+        # Record a milestone relative to process start
+        self._record(phase, 'at', time.perf_counter() - self.started)
+
+    def _record(self, phase: str, kind: str, seconds: float):
+        # Phases that finish after the report (e.g. a slow command sync) are logged straight away
+        if self.reported:
+            self._log(phase, kind, seconds)
+        else:
+            self.phases.append((phase, kind, seconds))
+
+    def _log(self, phase: str, kind: str, seconds: float):
+        logger.info(f"[Startup] {phase} {kind} {seconds * 1000:.0f} ms")
+
+    def report(self):
+        if self.reported:
+            return
+        self.reported = True
+        for phase, kind, seconds in self.phases:
+            self._log(phase, kind, seconds)
+        logger.info(f"[Startup] Posting bans {time.perf_counter() - self.started:.2f}s after launch")
+
+startup_timer = StartupTimer()
+
+def command_tree_hash(tree: discord.app_commands.CommandTree) -> str:
+    payload = []
+    for command in tree.get_commands():
+        try:
+            payload.append(command.to_dict(tree))
+        except TypeError:
+            # discord.py < 2.4 does not take the tree argument
+            payload.append(command.to_dict())
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+async def fetch_latest_ban(session: aiohttp.ClientSession) -> Optional[dict]:
+    """Fetch the most recent ban from BattleMetrics with its included data attached."""
+    headers = {
+        'Authorization': f'Bearer {BATTLEMETRICS_API_KEY}',
+        'Accept': 'application/json'
+    }
+    
+    params = {
+        'include': 'server,player,banList,user',
+        'sort': '-timestamp',
+        'filter[expired]': 'false',
+        'filter[organization]': BATTLEMETRICS_ORG_ID,
+        'filter[banList]': BATTLEMETRICS_BANLIST_ID,
+        'page[size]': 1
+    }
+    
+    # Add debug logging for request
+    logger.info(f"Making BattleMetrics API request with params: {params}")
+    
+    async with session.get(
+        'https://api.battlemetrics.com/bans',
+        headers=headers,
+        params=params,
+        timeout=aiohttp.ClientTimeout(total=10)
+    ) as response:
+        if response.status != 200:
+            response_text = await response.text()
+            logger.error(f"BattleMetrics API error {response.status}: {response_text}")
+            return None
+
+        data = await response.json()
+        if not data.get('data'):
+            return None
+
+        ban = data['data'][0]  # Get most recent ban
+        ban['included'] = data.get('included', [])
+        return ban
+
+def is_new_ban(ban: dict, last_ban_id: Optional[str], start_timestamp: datetime) -> bool:
+    # Check if this is a new ban and after bot start time
+    ban_timestamp = datetime.fromisoformat(
+        ban['attributes'].get('timestamp', '').replace('Z', '+00:00')
+    )
+    return last_ban_id != ban.get('id') and ban_timestamp > start_timestamp
+
+async def ingest_bans(ban_queue, start_timestamp: datetime, first_poll=None):
+    last_ban_id = None
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                ban = await fetch_latest_ban(session)
+                if first_poll is not None:
+                    # Lets the gateway report startup timings once bans can flow
+                    first_poll.set()
+                if ban and is_new_ban(ban, last_ban_id, start_timestamp):
+                    ban_queue.put(ban)
+                    last_ban_id = ban.get('id')
+                    logger.info(f"Ban {ban.get('id')} queued for publishing")
+            except aiohttp.ClientError as e:
+                logger.error(f"Network error in ingestion worker: {str(e)}")
+            except Exception as e:
+                logger.error(f"Ingestion worker error: {str(e)}", exc_info=True)
+            await asyncio.sleep(5)
+
+def run_ingest_worker(ban_queue, start_timestamp: datetime, first_poll=None):
+    """Entry point of the ingestion process: polls, decodes and dedups bans off the gateway loop."""
+    try:
+        asyncio.run(ingest_bans(ban_queue, start_timestamp, first_poll))
+    except KeyboardInterrupt:
+        pass
+
+@dataclass
+class BanRecord:
+    ban_id: str
+    timestamp: str
+    expires: str
+    player_name: str
+    player_id: str
+    steam_id: str
+    server_name: str
+    banned_by: str
+    reason: str
+    note: str
+
+def find_included_attribute(ban: dict, included: list, relation: str, attribute: str) -> str:
+    # Resolve a relationship (player, server, user) to an attribute of its included resource
+    related = ban.get('relationships', {}).get(relation, {}).get('data') or {}
+    for inc in included:
+        if inc.get('type') == related.get('type', relation) and inc.get('id') == related.get('id'):
+            return inc.get('attributes', {}).get(attribute) or 'Unknown'
+    return 'Unknown'
+
+def get_steam_id(attributes: dict) -> str:
+    for identifier in attributes.get('identifiers', []):
+        if identifier.get('type') == 'steamID':
+            return identifier.get('identifier') or 'Unknown'
+    return 'Unknown'
+
+def decode_bans(page: dict) -> Iterator[BanRecord]:
+    included = page.get('included', [])
+    for ban in page.get('data', []):
+        attributes = ban.get('attributes', {})
+        steam_id = get_steam_id(attributes)
+        yield BanRecord(
+            ban_id=ban.get('id', 'unknown'),
+            timestamp=attributes.get('timestamp') or '',
+            expires=attributes.get('expires') or 'Permanent',
+            player_name=find_included_attribute(ban, included, 'player', 'name'),
+            player_id=(ban.get('relationships', {}).get('player', {}).get('data') or {}).get('id') or '',
+            steam_id=steam_id,
+            server_name=find_included_attribute(ban, included, 'server', 'name'),
+            banned_by=find_included_attribute(ban, included, 'user', 'nickname'),
+            reason=attributes.get('reason') or '',
+            note=attributes.get('note') or ''
+        )
+
+def parse_retry_after(value: Optional[str], default: float) -> float:
+    # Retry-After may also be an HTTP date, fall back to our own backoff then
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
+
+async def fetch_ban_page(session: aiohttp.ClientSession, url: str, params: Optional[dict] = None) -> dict:
+    headers = {
+        'Authorization': f'Bearer {BATTLEMETRICS_API_KEY}',
+        'Accept': 'application/json'
+    }
+    for attempt in range(1, EXPORT_MAX_ATTEMPTS + 1):
+        backoff = 2 ** attempt
+        try:
+            async with session.get(url, headers=headers, params=params, timeout=aiohttp.ClientTimeout(total=30)) as response:
+                if response.status == 200:
+                    return await response.json()
+                if response.status == 429:
+                    # Rate limited, wait as long as BattleMetrics asks us to
+                    delay = parse_retry_after(response.headers.get('Retry-After'), backoff)
+                    error = "rate limited"
+                elif response.status >= 500:
+                    delay = backoff
+                    error = f"BattleMetrics API error {response.status}: {await response.text()}"
+                else:
+                    raise RuntimeError(f"BattleMetrics API error {response.status}: {await response.text()}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            delay = backoff
+            error = str(e) or type(e).__name__
+
+        if attempt == EXPORT_MAX_ATTEMPTS:
+            raise RuntimeError(f"Export page failed after {EXPORT_MAX_ATTEMPTS} attempts: {error}")
+        logger.warning(f"Export page attempt {attempt} failed ({error}), retrying in {delay:g}s")
+        await asyncio.sleep(delay)
+
+async def iter_ban_pages(session: aiohttp.ClientSession, include_expired: bool = True) -> AsyncIterator[dict]:
+    """Yield every page of the configured banlist, prefetching the next page while the caller works."""
+    params = {
+        'include': 'server,player,user',
+        'sort': '-timestamp',
+        'filter[expired]': 'true' if include_expired else 'false',
+        'filter[organization]': BATTLEMETRICS_ORG_ID,
+        'filter[banList]': BATTLEMETRICS_BANLIST_ID,
+        'page[size]': 100
+    }
+    next_page = asyncio.create_task(fetch_ban_page(session, 'https://api.battlemetrics.com/bans', params))
+    try:
+        while next_page:
+            page = await next_page
+            next_url = page.get('links', {}).get('next')
+            # The next link already carries the query parameters
+            next_page = asyncio.create_task(fetch_ban_page(session, next_url)) if next_url else None
+            yield page
+    finally:
+        if next_page:
+            next_page.cancel()
+
+class BanExportWriter:
+    """Writes ban records to a gzip-compressed CSV or NDJSON file as they arrive."""
+    FORMATS = ('csv', 'ndjson')
+
+    def __init__(self, path: str, file_format: str = 'csv'):
+        # Export only, keep these off the startup path
+        import csv
+        import gzip
+
+        if file_format not in self.FORMATS:
+            raise ValueError(f"Unsupported export format: {file_format}")
+        self.file_format = file_format
+        self.file = gzip.open(path, 'wt', encoding='utf-8', newline='')
+        self.csv_writer = None
+        if file_format == 'csv':
+            self.csv_writer = csv.writer(self.file)
+            self.csv_writer.writerow([field.name for field in fields(BanRecord)])
+
+    def write(self, records: Iterable[BanRecord]) -> int:
+        count = 0
+        for record in records:
+            if self.csv_writer:
+                self.csv_writer.writerow(astuple(record))
+            else:
+                self.file.write(json.dumps(asdict(record), ensure_ascii=False) + '\n')
+            count += 1
+        return count
+
+    def close(self):
+        self.file.close()
+
+async def export_bans(path: str, file_format: str = 'csv', include_expired: bool = True) -> int:
+    """Stream the whole banlist to a gzip file at path and return the number of bans written."""
+    loop = asyncio.get_running_loop()
+    writer = BanExportWriter(path, file_format)
+    count = 0
+    pending_write = None
+    try:
+        async with aiohttp.ClientSession() as session:
+            # aclosing cancels the prefetch task even when we stop early
+            async with contextlib.aclosing(iter_ban_pages(session, include_expired)) as pages:
+                async for page in pages:
+                    # Decode, format and compress off the event loop while the next page downloads
+                    pending_write = loop.run_in_executor(None, writer.write, decode_bans(page))
+                    count += await asyncio.shield(pending_write)
+    finally:
+        if pending_write is not None and not pending_write.done():
+            # Cancelling doesn't stop the executor thread, let it finish before the file is closed
+            await asyncio.wait({pending_write})
+        writer.close()
+    return count
+
+def export_filename(file_format: str) -> str:
+    # Random suffix keeps exports started in the same second apart
+    timestamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+    return f"bans-{BATTLEMETRICS_BANLIST_ID}-{timestamp}-{uuid.uuid4().hex[:8]}.{file_format}.gz"
+
+@dataclass
+class SteamProfile:
+    steam_id: str
+    persona_name: Optional[str] = None
+    avatar_url: Optional[str] = None
+    created: Optional[int] = None  # Unix timestamp, missing for private profiles
+    vac_bans: int = 0
+    game_bans: int = 0
+    days_since_last_ban: int = 0
+    community_banned: bool = False
+    has_summary: bool = True  # False when Steam returned nothing for the id
+
+    @classmethod
+    def from_api(cls, steam_id: str, summary: Optional[dict], bans: Optional[dict]) -> 'SteamProfile':
+        has_summary = summary is not None
+        summary = summary or {}
+        bans = bans or {}
+        return cls(
+            steam_id=steam_id,
+            persona_name=summary.get('personaname'),
+            avatar_url=summary.get('avatarfull'),
+            created=summary.get('timecreated'),
+            vac_bans=bans.get('NumberOfVACBans', 0),
+            game_bans=bans.get('NumberOfGameBans', 0),
+            days_since_last_ban=bans.get('DaysSinceLastBan', 0),
+            community_banned=bans.get('CommunityBanned', False),
+            has_summary=has_summary
+        )
+
+class SteamEnricher:
+    """Resolves SteamIDs in batched Steam Web API calls and caches the results for a while.
+
+    base_url can point at a local stub that serves the same two endpoints.
+    """
+    BATCH_SIZE = 100  # Steam accepts up to 100 ids per request
+    LOOKUP_TIMEOUT = 30  # Upper bound for callers waiting on a batch
+
+    def __init__(self, api_key: str, base_url: str = STEAM_API_URL, ttl: int = STEAM_CACHE_TTL, batch_delay: float = 0.5):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.ttl = ttl
+        self.batch_delay = batch_delay
+        self.cache = {}  # steam_id -> (expires_at, SteamProfile)
+        self.pending = {}  # steam_id -> Future waiting for the next batch
+        self._flush_task = None
+
+    def cached(self, steam_id: str) -> Optional[SteamProfile]:
+        # Cache peek without any network call
+        cached = self.cache.get(steam_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        return None
+
+    async def lookup(self, steam_id: str) -> Optional[SteamProfile]:
+        if not steam_id.isdigit():
+            return None
+
+        profile = self.cached(steam_id)
+        if profile:
+            return profile
+
+        future = self.pending.get(steam_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self.pending[steam_id] = future
+            if self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush())
+        return await asyncio.shield(future)
+
+    async def _flush(self):
+        # Give other pending bans a moment to join this batch
+        await asyncio.sleep(self.batch_delay)
+        self._flush_task = None
+        while self.pending:
+            batch = dict(list(self.pending.items())[:self.BATCH_SIZE])
+            for steam_id in batch:
+                del self.pending[steam_id]
+            try:
+                await self._resolve(batch)
+            except Exception as e:
+                logger.error(f"Steam lookup failed for {len(batch)} ids: {e}")
+            finally:
+                # Never leave a caller waiting on a batch that is no longer pending
+                for future in batch.values():
+                    if not future.done():
+                        future.set_result(None)
+
+    async def _resolve(self, batch: dict):
+        steam_ids = ','.join(batch)
+        async with aiohttp.ClientSession() as session:
+            summaries, bans = await asyncio.gather(
+                self._get(session, 'ISteamUser/GetPlayerSummaries/v2/', steam_ids),
+                self._get(session, 'ISteamUser/GetPlayerBans/v1/', steam_ids)
+            )
+
+        summaries_by_id = {p.get('steamid'): p for p in summaries.get('response', {}).get('players', [])}
+        bans_by_id = {p.get('SteamId'): p for p in bans.get('players', [])}
+
+        now = time.monotonic()
+        # Drop expired entries so the cache doesn't grow forever
+        self.cache = {k: v for k, v in self.cache.items() if v[0] > now}
+        for steam_id, future in batch.items():
+            profile = SteamProfile.from_api(steam_id, summaries_by_id.get(steam_id), bans_by_id.get(steam_id))
+            self.cache[steam_id] = (now + self.ttl, profile)
+            if not future.done():
+                future.set_result(profile)
+        logger.info(f"Resolved {len(batch)} Steam profiles in one batch")
+
+    async def _get(self, session: aiohttp.ClientSession, endpoint: str, steam_ids: str) -> dict:
+        async with session.get(
+            f"{self.base_url}/{endpoint}",
+            params={'key': self.api_key, 'steamids': steam_ids},
+            timeout=aiohttp.ClientTimeout(total=10)
+        ) as response:
+            if response.status != 200:
+                raise RuntimeError(f"Steam API error {response.status} from {endpoint}")
+            return await response.json()
 
 class BanEmbed:
     @staticmethod
@@ -128,11 +553,7 @@ class BanEmbed:
                             break
 
             # Get Steam ID
-            steam_id = 'Unknown'
-            for identifier in attributes.get('identifiers', []):
-                if identifier.get('type') == 'steamID':
-                    steam_id = identifier.get('identifier', 'Unknown')
-                    break
+            steam_id = get_steam_id(attributes)
 
             # Get server info
             server_name = 'Unknown'
@@ -195,7 +616,7 @@ class BanEmbed:
                 try:
                     expire_dt = datetime.fromisoformat(expires.replace('Z', '+00:00'))
                     expiry = expire_dt.strftime("%B %d, %Y %I:%M %p")
-                    relative = f"(in {(expire_dt - datetime.now(pytz.UTC)).days} days)"
+                    relative = f"(in {(expire_dt - datetime.now(timezone.utc)).days} days)"
                     expires_text = f"{expiry}\n{relative}"
                 except (ValueError, AttributeError):
                     expires_text = "Invalid date"
@@ -261,6 +682,46 @@ class BanEmbed:
             logger.error(f"Error creating ban embed: {str(e)}", exc_info=True)
             raise
 
+    @staticmethod
+    def add_steam_fields(embed: discord.Embed, profile: SteamProfile) -> discord.Embed:
+        if not profile.has_summary:
+            created_text = "Unavailable"
+        elif profile.created:
+            created_text = f"<t:{profile.created}:D> (<t:{profile.created}:R>)"
+        else:
+            created_text = "Private profile"
+
+        if profile.vac_bans:
+            vac_text = f"{profile.vac_bans} (last {profile.days_since_last_ban} days ago)"
+        else:
+            vac_text = "None"
+
+        game_text = str(profile.game_bans) if profile.game_bans else "None"
+        if profile.community_banned:
+            game_text += "\nCommunity banned"
+
+        steam_fields = {
+            "Account Created:": created_text,
+            "VAC Bans:": vac_text,
+            "Game Bans:": game_text
+        }
+
+        # Update the fields in place if the embed was enriched before, otherwise add them after the Steam link
+        names = [field.name for field in embed.fields]
+        insert_at = names.index("Steam Profile:") + 1 if "Steam Profile:" in names else len(names)
+        for name, value in steam_fields.items():
+            if name in names:
+                embed.set_field_at(names.index(name), name=name, value=value, inline=True)
+            else:
+                embed.insert_field_at(insert_at, name=name, value=value, inline=True)
+                names.insert(insert_at, name)
+                insert_at += 1
+
+        if profile.avatar_url:
+            embed.set_thumbnail(url=profile.avatar_url)
+
+        return embed
+
 class EvidenceModal(Modal):
     def __init__(self):
         super().__init__(title="Add Evidence Link")
@@ -397,7 +858,7 @@ class BanView(View):
             }
             
             # Get current time and add 5 seconds
-            current_time = datetime.now(pytz.UTC)
+            current_time = datetime.now(timezone.utc)
             expires_time = current_time + timedelta(seconds=5)
             
             # Set ban to expire in 5 seconds
@@ -412,14 +873,18 @@ class BanView(View):
             }
             
             # Make the PATCH request to update the ban
-            response = requests.patch(
-                f'https://api.battlemetrics.com/bans/{ban_id}',
-                headers=headers,
-                json=data
-            )
+            async with aiohttp.ClientSession() as session:
+                async with session.patch(
+                    f'https://api.battlemetrics.com/bans/{ban_id}',
+                    headers=headers,
+                    json=data,
+                    timeout=aiohttp.ClientTimeout(total=10)
+                ) as response:
+                    status = response.status
+                    response_text = await response.text()
             
             # Check for both 200 and 204 status codes as success
-            if response.status_code in [200, 204]:
+            if status in [200, 204]:
                 # Update the embed to show the ban is unbanned
                 for field in embed.fields:
                     if field.name == "Expires:":
@@ -445,13 +910,13 @@ class BanView(View):
                 logger.info(f"Ban {ban_id} has been removed by {interaction.user}")
                 
             else:
-                error_msg = f"Failed to update ban duration. Status code: {response.status_code}"
-                if response.text:
+                error_msg = f"Failed to update ban duration. Status code: {status}"
+                if response_text:
                     try:
-                        error_data = response.json()
+                        error_data = json.loads(response_text)
                         error_msg += f"\nError: {error_data}"
                     except:
-                        error_msg += f"\nResponse: {response.text}"
+                        error_msg += f"\nResponse: {response_text}"
                 
                 logger.error(error_msg)
                 await interaction.response.send_message(
@@ -495,8 +960,17 @@ class BanView(View):
                         # Create new embed with refreshed data
                         new_embed = BanEmbed.create_ban_embed(data['data'])
                         
+                        # Keep the Steam details, from cache only so the reply isn't delayed
+                        steam_enricher = getattr(interaction.client, 'steam_enricher', None)
+                        steam_id = get_steam_id(data['data'].get('attributes', {}))
+                        profile = steam_enricher.cached(steam_id) if steam_enricher else None
+                        if profile:
+                            BanEmbed.add_steam_fields(new_embed, profile)
+                        
                         # Update the message with new embed
                         await interaction.message.edit(embed=new_embed)
+                        if steam_enricher and not profile:
+                            interaction.client.schedule_enrichment(interaction.message, steam_id)
                         await interaction.response.send_message(
                             "✅ Ban information refreshed!",
                             ephemeral=True
@@ -532,8 +1006,231 @@ class UnbanConfirmView(View):
         await interaction.response.send_message("Unban cancelled.", ephemeral=True)
         self.stop()
 
+class LoopWatchdog:
+    """Measures event loop lag and logs the loop thread's stack while it is blocked."""
+    def __init__(self, threshold: float, interval: float = 0.5):
+        self.threshold = threshold
+        self.interval = interval
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id = None
+        self._task = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+
+        if ASYNCIO_DEBUG:
+            # asyncio logs every callback slower than this with its source traceback
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.threshold
+            asyncio_logger = logging.getLogger('asyncio')
+            for handler in logger.handlers:
+                asyncio_logger.addHandler(handler)
+
+        self._task = asyncio.create_task(self._measure_lag())
+        threading.Thread(target=self._watch, name='LoopWatchdog', daemon=True).start()
+        logger.info(f"[Watchdog] Monitoring event loop lag (threshold {self.threshold * 1000:.0f} ms)")
+
+    def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _measure_lag(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            self.last_lag = max(0.0, now - expected)
+            self.max_lag = max(self.max_lag, self.last_lag)
+            if self.last_lag > self.threshold:
+                logger.warning(f"[Watchdog] Event loop lagged {self.last_lag * 1000:.0f} ms")
+
+    def _watch(self):
+        # Runs in its own thread so it can see the loop while the loop is stuck
+        reported = False
+        while not self._stopped.wait(self.interval):
+            blocked_for = time.monotonic() - self._heartbeat - self.interval
+            if blocked_for <= self.threshold:
+                reported = False
+                continue
+            if reported:
+                continue
+
+            reported = True
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = ''.join(traceback.format_stack(frame)) if frame else 'Stack unavailable'
+            logger.warning(f"[Watchdog] Event loop blocked for {blocked_for * 1000:.0f} ms, loop thread stack:\n{stack}")
+
+    def summary(self) -> str:
+        return (
+            f"Last lag: {self.last_lag * 1000:.0f} ms, max lag: {self.max_lag * 1000:.0f} ms, "
+            f"stalls over {self.threshold * 1000:.0f} ms: {self.stalls}"
+        )
+
+async def capture_profile(seconds: int, top: int, watchdog: LoopWatchdog) -> str:
+    # Diagnostics only, keep these off the startup path
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    # Profiles everything the event loop runs while we sleep
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+
+    snapshot = tracemalloc.take_snapshot()
+    if started_tracing:
+        tracemalloc.stop()
+
+    report = io.StringIO()
+    report.write(f"BanBot profile captured {datetime.now(timezone.utc).isoformat()} over {seconds}s\n")
+    report.write(f"Watchdog: {watchdog.summary()}\n\n")
+
+    report.write(f"=== cProfile (top {top} by cumulative time) ===\n")
+    pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(top)
+
+    report.write(f"=== tracemalloc (top {top} by line) ===\n")
+    if started_tracing:
+        report.write("Tracing started for this capture, only allocations made during it are shown\n")
+    for stat in snapshot.statistics('lineno')[:top]:
+        report.write(f"{stat}\n")
+
+    return report.getvalue()
+
+class DebugCommands(discord.app_commands.Group):
+    def __init__(self, bot: 'BanBot'):
+        super().__init__(
+            name="debug",
+            description="Diagnostics for bot administrators",
+            default_permissions=discord.Permissions(administrator=True),
+            guild_only=True
+        )
+        self.bot = bot
+        self.profiling = False
+
+    @discord.app_commands.command(name="profile", description="Profile the running bot and attach the report")
+    @discord.app_commands.describe(
+        seconds="How long to profile for",
+        top="Number of entries in each section"
+    )
+    async def profile(
+        self,
+        interaction: discord.Interaction,
+        seconds: discord.app_commands.Range[int, 1, 60] = 10,
+        top: discord.app_commands.Range[int, 5, 50] = 20
+    ):
+        permissions = getattr(interaction.user, 'guild_permissions', None)
+        if not permissions or not permissions.administrator:
+            await interaction.response.send_message("This command is for administrators only.", ephemeral=True)
+            return
+
+        if self.profiling:
+            await interaction.response.send_message("A profile is already being captured.", ephemeral=True)
+            return
+
+        self.profiling = True
+        try:
+            await interaction.response.defer(ephemeral=True, thinking=True)
+            report = await capture_profile(seconds, top, self.bot.watchdog)
+            filename = f"banbot-profile-{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}.txt"
+            await interaction.followup.send(
+                f"Profile captured over {seconds}s.",
+                file=discord.File(io.BytesIO(report.encode('utf-8')), filename=filename),
+                ephemeral=True
+            )
+            logger.info(f"Profile captured by {interaction.user}")
+        except Exception as e:
+            logger.error(f"Error in debug profile: {e}", exc_info=True)
+            await interaction.followup.send(f"Please Report this to Puvify: {str(e)}", ephemeral=True)
+        finally:
+            self.profiling = False
+
+async def send_export_followup(interaction: discord.Interaction, content: str, **kwargs) -> bool:
+    # Long exports can outlive the 15 minute interaction token
+    try:
+        await interaction.followup.send(content, ephemeral=True, **kwargs)
+        return True
+    except discord.HTTPException as e:
+        logger.error(f"Could not send ban export reply to {interaction.user}: {e}")
+        return False
+
+@discord.app_commands.command(name="banexport", description="Export every ban on the banlist as a gzip file")
+@discord.app_commands.describe(
+    file_format="File format of the export",
+    include_expired="Include bans that have already expired"
+)
+@discord.app_commands.rename(file_format="format")
+@discord.app_commands.choices(file_format=[
+    discord.app_commands.Choice(name="CSV", value="csv"),
+    discord.app_commands.Choice(name="NDJSON", value="ndjson")
+])
+@discord.app_commands.default_permissions(ban_members=True)
+@discord.app_commands.guild_only()
+async def banexport(interaction: discord.Interaction, file_format: str = 'csv', include_expired: bool = True):
+    client = interaction.client
+    if getattr(client, 'exporting', False):
+        await interaction.response.send_message("A ban export is already running.", ephemeral=True)
+        return
+
+    client.exporting = True
+    try:
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = os.path.join(EXPORT_DIR, export_filename(file_format))
+
+        completed = False
+        try:
+            count = await export_bans(path, file_format, include_expired)
+            completed = True
+        except Exception as e:
+            logger.error(f"Error in banexport: {e}", exc_info=True)
+            await send_export_followup(
+                interaction,
+                f"Please Report this to Puvify: Ban export failed, no file was kept: {str(e)}"
+            )
+            return
+        finally:
+            # Don't leave an incomplete export behind, also when the bot shuts down mid-export
+            if not completed and os.path.exists(path):
+                os.remove(path)
+
+        logger.info(f"Ban export of {count} bans requested by {interaction.user} written to {path}")
+
+        size = os.path.getsize(path)
+        if size > interaction.guild.filesize_limit:
+            await send_export_followup(
+                interaction,
+                f"Exported {count} bans, but the file is too large to upload ({size // 1024} KB). "
+                f"It was saved on the bot host as `{path}`."
+            )
+            return
+
+        if await send_export_followup(interaction, f"Exported {count} bans.", file=discord.File(path)):
+            os.remove(path)
+        else:
+            logger.warning(f"Ban export was not delivered, it is saved on the bot host as {path}")
+    except Exception as e:
+        logger.error(f"Error in banexport: {e}", exc_info=True)
+    finally:
+        client.exporting = False
+
 class BanBot(discord.Client):
-    def __init__(self):
+    def __init__(self, ban_queue=None):
         intents = discord.Intents.default()
         intents.message_content = True
         intents.messages = True
@@ -544,22 +1241,62 @@ class BanBot(discord.Client):
             guild_ready_timeout=5.0  # Reduce guild ready timeout
         )
         self.last_ban_id = None
-        self.start_timestamp = datetime.now(pytz.UTC)
+        self.start_timestamp = datetime.now(timezone.utc)
         self.tree = discord.app_commands.CommandTree(self)
         self.is_first_ready = True  # Track first ready event
+        self.ban_queue = ban_queue  # Set when bans come from the ingestion process
+        self.ingest_process = None
+        self.first_poll = None  # Set by the ingestion process after its first poll
+        if ban_queue is not None:
+            import multiprocessing  # Multi-process mode only, keep it off the startup path
+            self.first_poll = multiprocessing.get_context('spawn').Event()
+        self.posted_ban_ids = collections.deque(maxlen=POSTED_BAN_HISTORY)
+        self.retry_bans = []  # Bans from the ingestion process that failed to post
+        self.ban_attempts = {}  # ban_id -> (failed attempts, monotonic time of next try)
+        self.exporting = False  # Only one /banexport at a time
+        self.sync_task = None
+        self.watchdog = LoopWatchdog(threshold=WATCHDOG_THRESHOLD_MS / 1000)
+        self.tree.add_command(DebugCommands(self))
+        self.tree.add_command(banexport)
+        self.steam_enricher = SteamEnricher(STEAM_API_KEY) if STEAM_API_KEY else None
+        self.enrich_tasks = set()
 
     async def setup_hook(self):
         try:
-            self.check_bans.start()
-            await self.tree.sync()
+            self.watchdog.start()
+            if self.ban_queue is not None:
+                self.consume_bans.start()
+            else:
+                self.check_bans.start()
+            # Sync in the background so it never holds up the gateway connection
+            self.sync_task = asyncio.create_task(self.sync_commands())
         except Exception as e:
             logger.error(f"Error in setup_hook: {e}", exc_info=True)
+
+    async def sync_commands(self):
+        try:
+            tree_hash = f"{self.application_id}:{command_tree_hash(self.tree)}"
+            try:
+                with open(COMMAND_HASH_FILE, encoding='utf-8') as f:
+                    if f.read().strip() == tree_hash:
+                        logger.info("Command tree unchanged, skipping sync")
+                        return
+            except FileNotFoundError:
+                pass
+
+            await startup_timer.track('Command sync', self.tree.sync())
+            with open(COMMAND_HASH_FILE, 'w', encoding='utf-8') as f:
+                f.write(tree_hash)
+            logger.info("Command tree synced successfully")
+        except Exception as e:
+            logger.error(f"Failed to sync command tree: {e}", exc_info=True)
             
     async def on_ready(self):
         try:
             logger.info(f'Bot logged in as {self.user}')
             
             if self.is_first_ready:
+                startup_timer.mark('Gateway ready')
                 channel = self.get_channel(DISCORD_CHANNEL_ID)
                 if channel:
                     try:
@@ -570,6 +1307,10 @@ class BanBot(discord.Client):
         except Exception as e:
             logger.error(f"Error in on_ready: {e}")
 
+    async def close(self):
+        self.watchdog.stop()
+        await super().close()
+
     async def on_disconnect(self):
         logger.warning("Bot disconnected from Discord")
 
@@ -585,95 +1326,16 @@ class BanBot(discord.Client):
             # Add rate limiting
             await asyncio.sleep(1)  # Prevent hitting rate limits
             
-            headers = {
-                'Authorization': f'Bearer {BATTLEMETRICS_API_KEY}',
-                'Accept': 'application/json'
-            }
-            
-            params = {
-                'include': 'server,player,banList,user',
-                'sort': '-timestamp',
-                'filter[expired]': 'false',
-                'filter[organization]': BATTLEMETRICS_ORG_ID,
-                'filter[banList]': BATTLEMETRICS_BANLIST_ID,
-                'page[size]': 1
-            }
-            
-            # Add debug logging for request
-            logger.info(f"Making BattleMetrics API request with params: {params}")
-            
             async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    'https://api.battlemetrics.com/bans',
-                    headers=headers,
-                    params=params,
-                    timeout=aiohttp.ClientTimeout(total=10)
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get('data'):
-                            ban = data['data'][0]  # Get most recent ban
-                            
-                            # Check if this is a new ban and after bot start time
-                            ban_timestamp = datetime.fromisoformat(
-                                ban['attributes'].get('timestamp', '').replace('Z', '+00:00')
-                            )
-                            
-                            if (self.last_ban_id != ban.get('id') and 
-                                ban_timestamp > self.start_timestamp):
-                                ban['included'] = data.get('included', [])
-                                
-                                channel = self.get_channel(DISCORD_CHANNEL_ID)
-                                if channel:
-                                    embed = BanEmbed.create_ban_embed(ban)
-                                    view = BanView()
-                                    ban_message = await channel.send(embed=embed, view=view)
-                                    
-                                    # Create thread for this ban
-                                    try:
-                                        # Get player name from included data
-                                        player_name = 'Unknown'
-                                        if 'player' in ban.get('relationships', {}):
-                                            player_id = ban['relationships']['player'].get('data', {}).get('id')
-                                            if player_id:
-                                                for inc in ban.get('included', []):
-                                                    if inc.get('type') == 'player' and inc.get('id') == player_id:
-                                                        player_name = inc.get('attributes', {}).get('name', 'Unknown')
-                                                        break
-                                        
-                                        thread = await ban_message.create_thread(
-                                            name=f"Ban Discussion - {player_name}",
-                                            auto_archive_duration=1440
-                                        )
-                                        
-                                        # Get banner info for mention
-                                        banner_name = 'Unknown'
-                                        if 'user' in ban.get('relationships', {}):
-                                            user_id = ban['relationships']['user'].get('data', {}).get('id')
-                                            if user_id:
-                                                for inc in ban.get('included', []):
-                                                    if inc.get('type') == 'user' and inc.get('id') == user_id:
-                                                        banner_name = inc.get('attributes', {}).get('nickname', 'Unknown')
-                                                        break
-                                        
-                                        banner_id = ADMIN_MAPPINGS.get(banner_name)
-                                        banner_text = f"{banner_name} (<@{banner_id}>)" if banner_id else banner_name
-                                        
-                                        mention = f"<@{banner_id}> " if banner_id else ""
-                                        
-                                        await thread.send(
-                                            f"{mention}Please discuss this ban here. If you have any videos or screenshots as evidence, please share them here."
-                                        )
-                                    except Exception as e:
-                                        logger.error(f"Failed to create thread: {e}")
-                                    
-                                    # Update last ban ID after successful send
-                                    self.last_ban_id = ban.get('id')
-                                    logger.info(f"New ban processed: {ban.get('id')}")
-                            
-                    else:
-                        response_text = await response.text()
-                        logger.error(f"BattleMetrics API error {response.status}: {response_text}")
+                ban = await fetch_latest_ban(session)
+            startup_timer.report()
+
+            if ban and is_new_ban(ban, self.last_ban_id, self.start_timestamp):
+                if await self.post_ban(ban):
+                    # Update last ban ID after successful send
+                    self.last_ban_id = ban.get('id')
+                    self.posted_ban_ids.append(ban.get('id'))
+                    logger.info(f"New ban processed: {ban.get('id')}")
                         
         except aiohttp.ClientError as e:
             logger.error(f"Network error in check_bans: {str(e)}")
@@ -682,6 +1344,170 @@ class BanBot(discord.Client):
         finally:
             await asyncio.sleep(5)
 
+    @tasks.loop(seconds=1)
+    async def consume_bans(self):
+        # Drain bans published by the ingestion process; never block the loop on the queue
+        if self.first_poll.is_set():
+            startup_timer.report()
+        if self.ingest_process and not self.ingest_process.is_alive():
+            logger.error(f"Ingestion process exited (code {self.ingest_process.exitcode}), restarting it")
+            try:
+                self.start_ingest_worker()
+            except Exception as e:
+                # Keep draining the queue, the restart is tried again next tick
+                logger.error(f"Failed to restart ingestion process: {e}", exc_info=True)
+
+        import queue  # Multi-process mode only
+
+        # Bans that failed to post last time go first
+        bans = self.retry_bans
+        self.retry_bans = []
+        while True:
+            try:
+                bans.append(self.ban_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        for ban in bans:
+            ban_id = ban.get('id')
+            # The gateway owns dedup, a restarted worker queues the latest ban again
+            # and retried bans can post after newer ones, so check every recent post
+            if ban_id in self.posted_ban_ids or any(b.get('id') == ban_id for b in self.retry_bans):
+                continue
+
+            attempts, next_try = self.ban_attempts.get(ban_id, (0, 0.0))
+            if time.monotonic() < next_try:
+                self.retry_bans.append(ban)
+                continue
+
+            try:
+                if await self.post_ban(ban):
+                    self.last_ban_id = ban_id
+                    self.posted_ban_ids.append(ban_id)
+                    self.ban_attempts.pop(ban_id, None)
+                    logger.info(f"New ban processed: {ban_id}")
+                    continue
+                error = "ban channel unavailable"
+            except (discord.Forbidden, discord.NotFound) as e:
+                # Retrying won't help while the bot can't see or post in the channel
+                logger.error(f"Dropping ban {ban_id}, Discord refused it: {e}")
+                self.ban_attempts.pop(ban_id, None)
+                continue
+            except Exception as e:
+                error = str(e)
+                if not attempts:
+                    # Only the first failure gets a traceback, retries would flood the log
+                    logger.error(f"Failed to publish ban {ban_id}: {e}", exc_info=True)
+
+            attempts += 1
+            if attempts >= MAX_BAN_POST_ATTEMPTS:
+                logger.error(f"Giving up on ban {ban_id} after {attempts} failed attempts: {error}")
+                self.ban_attempts.pop(ban_id, None)
+                continue
+
+            delay = min(2 ** attempts, 60)
+            self.ban_attempts[ban_id] = (attempts, time.monotonic() + delay)
+            logger.warning(f"Will retry ban {ban_id} in {delay}s (attempt {attempts} of {MAX_BAN_POST_ATTEMPTS} failed): {error}")
+            self.retry_bans.append(ban)
+
+    @consume_bans.before_loop
+    async def before_consume_bans(self):
+        await self.wait_until_ready()
+
+    @consume_bans.error
+    async def consume_bans_error(self, error):
+        logger.error(f"Ban consumer task error: {error}")
+
+    def start_ingest_worker(self):
+        import multiprocessing
+
+        # Spawn rather than fork, the gateway already runs threads and holds sockets
+        self.ingest_process = multiprocessing.get_context('spawn').Process(
+            target=run_ingest_worker,
+            args=(self.ban_queue, self.start_timestamp, self.first_poll),
+            name='BanIngest',
+            daemon=True  # Exit together with the gateway process
+        )
+        self.ingest_process.start()
+        logger.info(f"Started ingestion process (pid {self.ingest_process.pid})")
+
+    async def post_ban(self, ban: dict) -> bool:
+        channel = self.get_channel(DISCORD_CHANNEL_ID)
+        if not channel:
+            return False
+
+        embed = BanEmbed.create_ban_embed(ban)
+        view = BanView()
+        ban_message = await channel.send(embed=embed, view=view)
+
+        # Patch Steam details in once they arrive instead of delaying the post
+        if self.steam_enricher:
+            self.schedule_enrichment(ban_message, get_steam_id(ban.get('attributes', {})))
+        
+        # Create thread for this ban
+        try:
+            # Get player name from included data
+            player_name = 'Unknown'
+            if 'player' in ban.get('relationships', {}):
+                player_id = ban['relationships']['player'].get('data', {}).get('id')
+                if player_id:
+                    for inc in ban.get('included', []):
+                        if inc.get('type') == 'player' and inc.get('id') == player_id:
+                            player_name = inc.get('attributes', {}).get('name', 'Unknown')
+                            break
+            
+            thread = await ban_message.create_thread(
+                name=f"Ban Discussion - {player_name}",
+                auto_archive_duration=1440
+            )
+            
+            # Get banner info for mention
+            banner_name = 'Unknown'
+            if 'user' in ban.get('relationships', {}):
+                user_id = ban['relationships']['user'].get('data', {}).get('id')
+                if user_id:
+                    for inc in ban.get('included', []):
+                        if inc.get('type') == 'user' and inc.get('id') == user_id:
+                            banner_name = inc.get('attributes', {}).get('nickname', 'Unknown')
+                            break
+            
+            banner_id = ADMIN_MAPPINGS.get(banner_name)
+            
+            mention = f"<@{banner_id}> " if banner_id else ""
+            
+            await thread.send(
+                f"{mention}Please discuss this ban here. If you have any videos or screenshots as evidence, please share them here."
+            )
+        except Exception as e:
+            logger.error(f"Failed to create thread: {e}")
+
+        return True
+
+    def schedule_enrichment(self, message: discord.Message, steam_id: str):
+        task = asyncio.create_task(self.enrich_ban_message(message, steam_id))
+        self.enrich_tasks.add(task)
+        task.add_done_callback(self.enrich_tasks.discard)
+
+    async def enrich_ban_message(self, message: discord.Message, steam_id: str):
+        try:
+            profile = await asyncio.wait_for(
+                self.steam_enricher.lookup(steam_id),
+                timeout=SteamEnricher.LOOKUP_TIMEOUT
+            )
+            if not profile:
+                return
+
+            # Fetch again so evidence added in the meantime is not overwritten
+            message = await message.channel.fetch_message(message.id)
+            if not message.embeds:
+                return
+            embed = BanEmbed.add_steam_fields(message.embeds[0], profile)
+            await message.edit(embed=embed)
+        except asyncio.TimeoutError:
+            logger.warning(f"Steam lookup for {steam_id} timed out, ban message left without Steam details")
+        except Exception as e:
+            logger.error(f"Failed to add Steam details to ban message: {e}")
+
     @check_bans.before_loop
     async def before_check_bans(self):
         await self.wait_until_ready()
@@ -715,57 +1541,122 @@ class BanBot(discord.Client):
         except Exception as e:
             logger.error(f"Error in on_message: {e}", exc_info=True)
 
-def main():
-    try:
-        # Validate environment variables
-        required_vars = {
-            'BATTLEMETRICS_API_KEY': BATTLEMETRICS_API_KEY,
-            'DISCORD_TOKEN': DISCORD_TOKEN,
-            'DISCORD_CHANNEL_ID': DISCORD_CHANNEL_ID,
-            'BATTLEMETRICS_ORG_ID': BATTLEMETRICS_ORG_ID,
-            'BATTLEMETRICS_BANLIST_ID': BATTLEMETRICS_BANLIST_ID
-        }
+def validate_config() -> bool:
+    required_vars = {
+        'BATTLEMETRICS_API_KEY': BATTLEMETRICS_API_KEY,
+        'DISCORD_TOKEN': DISCORD_TOKEN,
+        'DISCORD_CHANNEL_ID': DISCORD_CHANNEL_ID,
+        'BATTLEMETRICS_ORG_ID': BATTLEMETRICS_ORG_ID,
+        'BATTLEMETRICS_BANLIST_ID': BATTLEMETRICS_BANLIST_ID
+    }
 
-        for var_name, var_value in required_vars.items():
-            if not var_value:
-                logger.critical(f"Missing required environment variable: {var_name}")
-                sys.exit(1)
+    for var_name, var_value in required_vars.items():
+        if not var_value:
+            logger.critical(f"Missing required environment variable: {var_name}")
+            return False
+    return True
 
-        # Validate API key and banlist
-        try:
-            response = requests.get(
-                f'https://api.battlemetrics.com/bans',
+async def validate_battlemetrics() -> bool:
+    # Validate API key and banlist
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(
+                'https://api.battlemetrics.com/bans',
                 headers={'Authorization': f'Bearer {BATTLEMETRICS_API_KEY}'},
                 params={
                     'filter[banList]': BATTLEMETRICS_BANLIST_ID,
                     'page[size]': 1
-                }
-            )
+                },
+                timeout=aiohttp.ClientTimeout(total=10)
+            ) as response:
+                if response.status != 200:
+                    logger.critical(f"Invalid BattleMetrics API key or banlist ID (Status code: {response.status})")
+                    logger.critical(f"Response: {await response.text()}")
+                    return False
 
-            if response.status_code != 200:
-                logger.critical(f"Invalid BattleMetrics API key or banlist ID (Status code: {response.status_code})")
-                logger.critical(f"Response: {response.text}")
-                sys.exit(1)
+                data = await response.json()
+                if 'data' not in data:
+                    logger.critical("API response missing 'data' field")
+                    return False
 
-            data = response.json()
-            if 'data' not in data:
-                logger.critical("API response missing 'data' field")
-                sys.exit(1)
-                
-            logger.info("BattleMetrics API key and banlist ID validated successfully")
-            
-        except Exception as e:
-            logger.critical(f"Failed to validate BattleMetrics API configuration: {str(e)}")
+        logger.info("BattleMetrics API key and banlist ID validated successfully")
+        return True
+
+    except Exception as e:
+        logger.critical(f"Failed to validate BattleMetrics API configuration: {str(e)}")
+        return False
+
+async def start_bot(client: BanBot) -> bool:
+    async with client:
+        # Check BattleMetrics credentials while logging in to Discord
+        bm_valid, _ = await asyncio.gather(
+            startup_timer.track('BattleMetrics check', validate_battlemetrics()),
+            startup_timer.track('Discord login', client.login(DISCORD_TOKEN))
+        )
+        if not bm_valid:
+            return False
+
+        await client.connect(reconnect=True)
+    return True
+
+def main():
+    try:
+        # Validate environment variables
+        if not validate_config():
             sys.exit(1)
+        startup_timer.mark('Config validated')
 
         # Initialize and run bot
-        client = BanBot()
+        ban_queue = None
+        if MULTIPROCESS:
+            import multiprocessing  # Multi-process mode only, keep it off the startup path
+            ban_queue = multiprocessing.get_context('spawn').Queue()
+
+        client = BanBot(ban_queue=ban_queue)
+
+        if MULTIPROCESS:
+            client.start_ingest_worker()
+
         logger.info("Starting bot...")
-        client.run(DISCORD_TOKEN, log_handler=None)
+        if not asyncio.run(start_bot(client)):
+            sys.exit(1)
 
+    except KeyboardInterrupt:
+        logger.info("Bot stopped by user")
     except Exception as e:
         logger.critical(f"Fatal error during bot startup: {str(e)}", exc_info=True)
         sys.exit(1)
 
+def export_main():
+    import argparse  # Only the export CLI parses arguments
+
+    parser = argparse.ArgumentParser(description="Export every ban on the configured BattleMetrics banlist")
+    parser.add_argument('--format', choices=BanExportWriter.FORMATS, default='csv', help="Output format (default: csv)")
+    parser.add_argument('--output', help="Output file path (default: a timestamped .gz file in EXPORT_DIR)")
+    parser.add_argument('--active-only', action='store_true', help="Skip bans that have already expired")
+    args = parser.parse_args()
+
+    try:
+        for var_name in ('BATTLEMETRICS_API_KEY', 'BATTLEMETRICS_ORG_ID', 'BATTLEMETRICS_BANLIST_ID'):
+            if not os.getenv(var_name):
+                logger.critical(f"Missing required environment variable: {var_name}")
+                sys.exit(1)
+
+        path = args.output
+        if not path:
+            os.makedirs(EXPORT_DIR, exist_ok=True)
+            path = os.path.join(EXPORT_DIR, export_filename(args.format))
+
+        started = time.perf_counter()
+        count = asyncio.run(export_bans(path, args.format, not args.active_only))
+        logger.info(f"Exported {count} bans to {path} in {time.perf_counter() - started:.1f}s")
+
+    except KeyboardInterrupt:
+        logger.info("Export cancelled by user")
+        sys.exit(1)
+    except Exception as e:
+        logger.critical(f"Ban export failed: {str(e)}", exc_info=True)
+        sys.exit(1)
+
 if __name__ == "__main__":
     main() 
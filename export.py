@@ -0,0 +1,4 @@
+from bot import export_main
+
+if __name__ == "__main__":
+    export_main() 
\ No newline at end of file